@@ -31,6 +31,50 @@
 """
 
 
+import threading
+import time
+import timeit
+import tracemalloc
+
+
+class ProductRegistry(object):
+    """
+    产品注册表: 用字典代替if/elif判断链
+        1. 通过装饰器注册具体产品，新增产品时无需修改工厂
+        2. 按参数查找具体产品类，查找开销与已注册产品的数量无关
+        3. 支持别名，以及可选的大小写不敏感查找
+    """
+
+    def __init__(self, case_insensitive=False):
+        self.case_insensitive = case_insensitive
+        self._products = {}
+
+    def _key(self, form):
+        return form.lower() if self.case_insensitive and isinstance(form, str) else form
+
+    def register(self, form, *aliases):
+        def decorator(product_cls):
+            for key in (form,) + aliases:
+                self._products[self._key(key)] = product_cls
+            return product_cls
+        return decorator
+
+    def unregister(self, form):
+        self._products.pop(self._key(form), None)
+
+    def lookup(self, form):
+        return self._products.get(self._key(form))
+
+    def __contains__(self, form):
+        return self._key(form) in self._products
+
+    def __len__(self):
+        return len(self._products)
+
+
+button_registry = ProductRegistry(case_insensitive=True)
+
+
 class ButtonProduct(object):
     """
     1. 颜色
@@ -43,30 +87,203 @@ class ButtonProduct(object):
     def __str__(self):
         return self.form
 
+    def reset(self):
+        """
+        归还对象池前调用，子类在此清理本次使用留下的状态
+        """
+        pass
+
 
+@button_registry.register("circle")
 class CircleButtonConcreate(ButtonProduct):
     def __init__(self):
         super().__init__("Circle")
 
 
+@button_registry.register("rectang", "rectangle")
 class RectangleButtonConcreate(ButtonProduct):
     def __init__(self):
         super().__init__("Rectang")
 
 
+compact_button_registry = ProductRegistry(case_insensitive=True)
+
+
+class CompactButtonProduct(object):
+    """
+    紧凑模式的产品: 使用__slots__代替实例__dict__，大量按钮常驻内存时可以显著节省空间
+    """
+    __slots__ = ("form",)
+
+    def __init__(self, form):
+        self.form = form
+
+    def __str__(self):
+        return self.form
+
+    def reset(self):
+        pass
+
+
+@compact_button_registry.register("circle")
+class CompactCircleButtonConcreate(CompactButtonProduct):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__("Circle")
+
+
+@compact_button_registry.register("rectang", "rectangle")
+class CompactRectangleButtonConcreate(CompactButtonProduct):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__("Rectang")
+
+
+class ButtonPool(object):
+    """
+    产品对象池: 复用已经归还的产品，减少频繁创建对象带来的内存分配与GC开销
+        1. 每种具体产品一个池子，池子大小有上限
+        2. acquire/release 在锁内完成，支持多线程借出与归还
+        3. 只接受从本池借出且尚未归还的对象，重复归还或归还外来对象会抛出ValueError
+           借出的对象本身被记录下来(而不只是id)，未归还的对象不会被回收，其地址也就不会被外来对象复用
+        4. release在一次加锁内完成校验、reset与入池，reset应当是轻量的清理操作
+        5. 记录命中率与每个池子的历史最高水位
+    """
+
+    def __init__(self, registry, max_size=64):
+        self.registry = registry
+        self.max_size = max_size
+        self._pools = {}
+        self._checked_out = {}
+        self._lock = threading.Lock()
+        self.acquires = 0
+        self.hits = 0
+        self.high_water = {}
+
+    def acquire(self, form):
+        product_cls = self.registry.lookup(form)
+        if product_cls is None:
+            return None
+        with self._lock:
+            self.acquires += 1
+            pool = self._pools.get(product_cls)
+            if pool:
+                self.hits += 1
+                product = pool.pop()
+                self._checked_out[id(product)] = product
+                return product
+        product = product_cls()
+        with self._lock:
+            self._checked_out[id(product)] = product
+        return product
+
+    def release(self, product):
+        product_cls = type(product)
+        with self._lock:
+            if self._checked_out.get(id(product)) is not product:
+                raise ValueError("{!r}不是从该对象池借出的，或已经归还".format(product))
+            del self._checked_out[id(product)]
+            product.reset()
+            pool = self._pools.setdefault(product_cls, [])
+            if len(pool) < self.max_size:
+                pool.append(product)
+                name = product_cls.__name__
+                if len(pool) > self.high_water.get(name, 0):
+                    self.high_water[name] = len(pool)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "acquires": self.acquires,
+                "hits": self.hits,
+                "hit_rate": self.hits / self.acquires if self.acquires else 0.0,
+                "high_water": dict(self.high_water),
+            }
+
+
 class ButtonFactory(object):
+    registry = button_registry
+    pool = ButtonPool(button_registry)
+
+    @classmethod
+    def create_product(cls, form):
+        product_cls = cls.registry.lookup(form)
+        if product_cls is not None:
+            return product_cls()
+
     @classmethod
-    def create_product(self, form):
-        if form == "circle":
-            return CircleButtonConcreate()
-        elif form == "rectang":
-            return RectangleButtonConcreate()
+    def acquire_product(cls, form):
+        return cls.pool.acquire(form)
+
+    @classmethod
+    def release_product(cls, product):
+        cls.pool.release(product)
+
+
+class CompactButtonFactory(ButtonFactory):
+    """
+    紧凑模式的工厂: 与ButtonFactory用法相同，创建的是__slots__产品
+    """
+    registry = compact_button_registry
+    pool = ButtonPool(compact_button_registry)
+
+
+def benchmark_registry_lookup(sizes=(2, 10, 100, 1000, 10000), number=100000):
+    """
+    注册表查找的微基准: 注册产品数从2增长到10000，单次查找耗时应基本保持不变
+    """
+    for size in sizes:
+        registry = ProductRegistry(case_insensitive=True)
+        for i in range(size):
+            registry.register("form{}".format(i))(type("Form{}".format(i), (ButtonProduct,), {}))
+        form = "form{}".format(size - 1)
+        cost = timeit.timeit(lambda: registry.lookup(form), number=number)
+        print("注册产品数:{:>6}, 单次查找耗时:{:.1f}ns".format(size, cost / number * 1e9))
+
+
+def benchmark_pool(number=1000000):
+    """
+    对比直接创建与对象池借出/归还各number次的耗时
+    """
+    start = time.perf_counter()
+    for _ in range(number):
+        ButtonFactory.create_product("circle")
+    fresh = time.perf_counter() - start
+
+    pool = ButtonPool(button_registry)
+    start = time.perf_counter()
+    for _ in range(number):
+        pool.release(pool.acquire("circle"))
+    pooled = time.perf_counter() - start
+
+    print("直接创建{}次:{:.3f}s, 对象池{}次:{:.3f}s".format(number, fresh, number, pooled))
+    print("对象池统计:{}".format(pool.stats()))
+
+
+def benchmark_memory(number=1000000):
+    """
+    使用tracemalloc统计常驻number个按钮时，每个实例平均占用的字节数
+    """
+    for factory in (ButtonFactory, CompactButtonFactory):
+        tracemalloc.start()
+        buttons = [factory.create_product("circle") for _ in range(number)]
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print("{}: {:.1f} 字节/个".format(factory.__name__, current / len(buttons)))
+        del buttons
+
 
 if __name__ == '__main__':
 
     product = ButtonFactory.create_product("circle")
     print(product)
 
+    benchmark_registry_lookup()
+    benchmark_pool()
+    benchmark_memory()
+
 """
 模型分析:
     简单工厂模式要点在于:当你需要什么，只需要传入一个正确的参数，就可以获取你所需要的对象，而无须知道其创建细节
@@ -77,6 +294,8 @@ if __name__ == '__main__':
     缺点:
         1. 简单工厂模式最大的问题就是工厂类的职责相对过重，增加新产品时需要修改工厂类的判断逻辑，这一点是与开闭原则是相违背的。
         2. 系统扩展困难，一但添加新产品，就不得不修改工厂逻辑，在产品类型较多的时候，有可能造成工厂逻辑复杂，不利于系统的维护和扩展
+    改进:
+        使用ProductRegistry注册表代替判断逻辑，新增产品只需用装饰器注册，工厂无需修改，且查找开销不随产品数量增长
         
 """
 
@@ -27,6 +27,9 @@
     4. Concreate Factory 具体工厂
 """
 import abc
+import time
+import tracemalloc
+from itertools import repeat
 
 
 class ButtonProduct(metaclass=abc.ABCMeta):
@@ -37,28 +40,72 @@ class ButtonProduct(metaclass=abc.ABCMeta):
     def __str__(self):
         return self.form
 
-class BaseFactory(metaclass=abc.ABCMeta):
+class CompactButtonProduct(metaclass=abc.ABCMeta):
+    """
+    紧凑模式的产品: 使用__slots__代替实例__dict__
+    """
+    __slots__ = ("form",)
+
     def __init__(self, form):
         self.form = form
 
+    def __str__(self):
+        return self.form
+
+class BaseFactory(metaclass=abc.ABCMeta):
+    def __init__(self, form, compact=False):
+        self.form = form
+        self.compact = compact
+
     @abc.abstractmethod
     def create_button(self):
         pass
 
+    def create_many(self, n):
+        """
+        批量创建n个产品，默认逐个调用工厂方法，子类可以覆盖为更高效的实现
+        """
+        return [self.create_button() for _ in repeat(None, n)]
+
+    @staticmethod
+    def create_batch(specs):
+        """
+        specs: [(工厂, 数量), ...]，按顺序把每个工厂批量创建的产品合并返回
+        """
+        products = []
+        for factory, n in specs:
+            products.extend(factory.create_many(n))
+        return products
+
+    @staticmethod
+    def _allocate(product_cls, n):
+        # 直接调用产品类的构造方法，省去每个产品一次create_button的方法分派
+        return [product_cls() for _ in repeat(None, n)]
+
 class CircleButtonFactory(BaseFactory):
-    def __init__(self):
-        super().__init__('circle')
+    def __init__(self, compact=False):
+        super().__init__('circle', compact)
 
     def create_button(self):
+        if self.compact:
+            return CompactCircleButtonConcreate()
         return CircleButtonConcreate()
 
+    def create_many(self, n):
+        return self._allocate(CompactCircleButtonConcreate if self.compact else CircleButtonConcreate, n)
+
 class RectangleButtonFactory(BaseFactory):
-    def __init__(self):
-        super().__init__('rectangle')
+    def __init__(self, compact=False):
+        super().__init__('rectangle', compact)
 
     def create_button(self):
+        if self.compact:
+            return CompactRectangleButtonConcreate()
         return RectangleButtonConcreate()
 
+    def create_many(self, n):
+        return self._allocate(CompactRectangleButtonConcreate if self.compact else RectangleButtonConcreate, n)
+
 class CircleButtonConcreate(ButtonProduct):
     def __init__(self):
         super().__init__("Circle")
@@ -69,11 +116,61 @@ class RectangleButtonConcreate(ButtonProduct):
         super().__init__("Rectang")
 
 
+class CompactCircleButtonConcreate(CompactButtonProduct):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__("Circle")
+
+
+class CompactRectangleButtonConcreate(CompactButtonProduct):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__("Rectang")
+
+
+def benchmark_create_many(n=100000, rounds=5):
+    """
+    对比默认逐个创建与子类优化批量创建的吞吐量(个/秒)
+    """
+    for factory in (CircleButtonFactory(), RectangleButtonFactory(), CircleButtonFactory(compact=True)):
+        for label, create_many in (("默认路径", lambda n: BaseFactory.create_many(factory, n)),
+                                   ("优化路径", factory.create_many)):
+            best = float("inf")
+            for _ in range(rounds):
+                start = time.perf_counter()
+                create_many(n)
+                best = min(best, time.perf_counter() - start)
+            print("{}{} {}: {:,.0f} 个/秒".format(
+                type(factory).__name__, "(紧凑模式)" if factory.compact else "", label, n / best))
+
+
+def benchmark_memory(number=1000000):
+    """
+    使用tracemalloc统计常驻number个按钮时，每个实例平均占用的字节数
+    """
+    for compact in (False, True):
+        factory = CircleButtonFactory(compact)
+        tracemalloc.start()
+        buttons = [factory.create_button() for _ in range(number)]
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print("{}: {:.1f} 字节/个".format("紧凑模式" if compact else "普通模式", current / len(buttons)))
+        del buttons
+
+
 if __name__ == '__main__':
     circle_factory = CircleButtonFactory()
     circle_button = circle_factory.create_button()
     print(circle_button)
 
+    buttons = BaseFactory.create_batch([(circle_factory, 2), (RectangleButtonFactory(), 1)])
+    print(", ".join(str(button) for button in buttons))
+
+    benchmark_create_many()
+    benchmark_memory()
+
 """
 模式分析:
     工厂方法模式是简单工厂模式的进一步抽象和推广
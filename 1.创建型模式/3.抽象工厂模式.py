@@ -38,6 +38,13 @@
 电脑:CPU(inter amd) 内存(Kingston dell) 硬盘  显卡...
 """
 import abc
+import json
+import os
+import tempfile
+import threading
+import time
+
+
 class CPUAbstractFactory(metaclass=abc.ABCMeta):
     @abc.abstractmethod
     def interface(self):
@@ -88,26 +95,173 @@ class LenovoProduct(ComputerAbstractProduct):
     def open(self):
         return "联想笔记本开机,配置cpu:{}, 内存:{}".format(self.cpu, self.flash)
 
+class ComponentCache(object):
+    """
+    组件工厂缓存: 无状态的组件工厂只在第一次使用时创建一次，之后所有电脑工厂共享
+    """
+
+    def __init__(self):
+        self._components = {}
+        self._lock = threading.Lock()
+
+    def get(self, component_cls):
+        component = self._components.get(component_cls)
+        if component is None:
+            with self._lock:
+                component = self._components.get(component_cls)
+                if component is None:
+                    component = component_cls()
+                    self._components[component_cls] = component
+        return component
+
+    def invalidate(self, component_cls=None):
+        """
+        失效缓存: 不传参数时清空全部组件，否则只清除指定的组件工厂
+        """
+        with self._lock:
+            if component_cls is None:
+                self._components.clear()
+            else:
+                self._components.pop(component_cls, None)
+
+
+component_cache = ComponentCache()
+
+
 class ComputerAbstractFactory(metaclass=abc.ABCMeta):
 
+    def __init__(self, cached=False):
+        self.cached = cached
+
+    def component(self, component_cls):
+        if self.cached:
+            return component_cache.get(component_cls)
+        return component_cls()
+
     @abc.abstractmethod
     def create_product(self):
         pass
 
 class XMComputerFactory(ComputerAbstractFactory):
     def create_product(self):
-        cpu = InterCPUFactory()
-        flash = DellFlashFactory()
+        cpu = self.component(InterCPUFactory)
+        flash = self.component(DellFlashFactory)
         return XMProduct(cpu, flash)
 
 
 class LenovoComputerFactory(ComputerAbstractFactory):
     def create_product(self):
-        cpu = InterCPUFactory()
-        flash = DellFlashFactory()
+        cpu = self.component(InterCPUFactory)
+        flash = self.component(DellFlashFactory)
         return LenovoProduct(cpu, flash)
 
 
+class FamilyLoader(object):
+    """
+    产品族配置加载器: 从JSON/TOML文件读取各品牌的CPU/内存搭配，编译成 品牌 -> (产品类, CPU工厂, 内存工厂) 的查找表
+    编译结果按配置文件的修改时间缓存到磁盘(JSON格式，只包含字符串，读取缓存不会执行任何代码)，配置不变时再次启动无需重新解析
+    配置格式:
+        {"families": {"xiaomi": {"product": "XMProduct", "cpu": "InterCPUFactory", "flash": "DellFlashFactory"}}}
+    """
+    products = {cls.__name__: cls for cls in (XMProduct, LenovoProduct)}
+    cpus = {cls.__name__: cls for cls in (InterCPUFactory, AMDCPUFactory)}
+    flashes = {cls.__name__: cls for cls in (KingstonFlashFactory, DellFlashFactory)}
+
+    def __init__(self, path, cache_path=None):
+        self.path = path
+        self.cache_path = cache_path or path + ".cache"
+
+    def _parse(self):
+        if self.path.endswith(".toml"):
+            import tomllib
+            with open(self.path, "rb") as f:
+                config = tomllib.load(f)
+        else:
+            with open(self.path, encoding="utf-8") as f:
+                config = json.load(f)
+        return {brand: (family["product"], family["cpu"], family["flash"])
+                for brand, family in config["families"].items()}
+
+    def _read_cache(self, key):
+        # 缓存文件可能不存在、被截断或不是本程序写入的，这些情况都退回重新解析配置
+        try:
+            with open(self.cache_path, encoding="utf-8") as f:
+                cached = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(cached, dict) or cached.get("key") != list(key) or not isinstance(cached.get("families"), dict):
+            return None
+        return {brand: tuple(names) for brand, names in cached["families"].items()}
+
+    def _write_cache(self, key, names):
+        try:
+            with open(self.cache_path, "w", encoding="utf-8") as f:
+                json.dump({"key": list(key), "families": names}, f)
+        except OSError:
+            pass
+
+    def load(self):
+        stat = os.stat(self.path)
+        key = (stat.st_mtime_ns, stat.st_size)
+        names = self._read_cache(key)
+        if names is None:
+            names = self._parse()
+            self._write_cache(key, names)
+        return {brand: (self.products[product], self.cpus[cpu], self.flashes[flash])
+                for brand, (product, cpu, flash) in names.items()}
+
+
+class ConfiguredComputerFactory(ComputerAbstractFactory):
+    """
+    由配置驱动的电脑工厂: 切换产品族只需要换一个品牌名，不需要新增工厂类
+    """
+
+    def __init__(self, families, brand, cached=False):
+        super().__init__(cached)
+        self.product_cls, self.cpu_cls, self.flash_cls = families[brand]
+
+    def create_product(self):
+        return self.product_cls(self.component(self.cpu_cls), self.component(self.flash_cls))
+
+
+def benchmark_family_loader(number=10000):
+    """
+    生成number个产品族的配置，对比首次启动(解析+写缓存)与再次启动(命中缓存)的加载耗时
+    """
+    families = {"brand{}".format(i): {"product": "XMProduct" if i % 2 else "LenovoProduct",
+                                      "cpu": "InterCPUFactory" if i % 3 else "AMDCPUFactory",
+                                      "flash": "DellFlashFactory" if i % 5 else "KingstonFlashFactory"}
+                for i in range(number)}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "families.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"families": families}, f)
+        for label in ("首次启动", "再次启动"):
+            start = time.perf_counter()
+            FamilyLoader(path).load()
+            print("{}个产品族{}: {:.1f}ms".format(number, label, (time.perf_counter() - start) * 1000))
+
+
+def benchmark_create_product(threads=8, number=100000):
+    """
+    threads个线程同时调用create_product，对比普通模式与缓存模式的吞吐量(个/秒)
+    """
+    for cached in (False, True):
+        factory = XMComputerFactory(cached)
+
+        def work():
+            for _ in range(number):
+                factory.create_product()
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        cost = time.perf_counter() - start
+        print("{}: {:,.0f} 个/秒".format("缓存模式" if cached else "普通模式", threads * number / cost))
+
 
 if __name__ == '__main__':
 
@@ -117,6 +271,16 @@ if __name__ == '__main__':
     print(xiaomi.open())
     print(lenovo.open())
 
+    cached_xiaomi = XMComputerFactory(cached=True).create_product()
+    cached_lenovo = LenovoComputerFactory(cached=True).create_product()
+    print(cached_xiaomi.cpu is cached_lenovo.cpu)
+
+    families = {"xiaomi-amd": (XMProduct, AMDCPUFactory, KingstonFlashFactory)}
+    print(ConfiguredComputerFactory(families, "xiaomi-amd").create_product().open())
+
+    benchmark_create_product()
+    benchmark_family_loader()
+
 """
 优点:
     抽象工厂模式隔离了具体类的生成，使得客户并不需要知道什么被创建。
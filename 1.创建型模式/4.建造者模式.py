@@ -57,11 +57,34 @@
     6. 建造者模式将复杂对象的构建与对象的表现分离开来，这样使得同样的构建过程可以创建出不同的表现。
 """
 import abc
+import contextlib
+import csv
+import io
+import json
+import operator
+import os
+import sys
+import time
+import timeit
+import tracemalloc
+from array import array
+from collections import namedtuple
+from itertools import accumulate, islice
 
 class Packing(metaclass=abc.ABCMeta):
     """
     包装: 纸袋包装 / 瓶子包装
+    同一种包装只有一个规范实例，Wrapper()/Bottle() 每次返回同一个对象
     """
+    _instances = {}
+
+    def __new__(cls, *args):
+        key = (cls,) + args
+        instance = Packing._instances.get(key)
+        if instance is None:
+            instance = Packing._instances.setdefault(key, super().__new__(cls))
+        return instance
+
     def __init__(self, type):
         self.type = type
 
@@ -88,12 +111,16 @@ class Item(metaclass=abc.ABCMeta):
         print("{}价格:{}".format(self.name, self.price))
 
 class Burger(Item):
+    category = "burger"
+
     def __init__(self, name, packing, price):
         super().__init__(name, packing, price)
 
     def __str__(self):
         print("{}价格:{}".format(self.name, self.price))
 class ColdDrink(Item):
+    category = "cold_drink"
+
     def __init__(self, name, packing, price):
         super().__init__(name, packing, price)
 
@@ -130,40 +157,240 @@ class Pepsi(ColdDrink):
 
 
 class Meal(metaclass=abc.ABCMeta):
+    """
+    套餐: 添加/删除条目时增量维护总价、各包装数量、各类别总价，查询均为O(1)
+    """
 
     def __init__(self):
+        self.cost = 0
+        self.packing_counts = {}
+        self.category_costs = {}
         self.items = []
 
+    def _account(self, item, quantity):
+        self.cost += item.price * quantity
+        packing = item.packing.type
+        self.packing_counts[packing] = self.packing_counts.get(packing, 0) + quantity
+        self.category_costs[item.category] = self.category_costs.get(item.category, 0) + item.price * quantity
+
     def add_item(self, item):
         self.items.append(item)
+        self._account(item, 1)
+
+    def remove_item(self, item):
+        self.items.remove(item)
+        self._account(item, -1)
 
     def get_cost(self):
-        cost = 0
-        for item in self.items:
-            cost += item.price
-        return cost
+        return self.cost
+
+    def get_packing_count(self, packing):
+        return self.packing_counts.get(packing, 0)
+
+    def get_category_cost(self, category):
+        return self.category_costs.get(category, 0)
+
+    def counted_items(self):
+        return ((item, 1) for item in self.items)
 
     def show_item(self):
-        for item in self.items:
-            print("名称:{}, 包装:{}, 价格:{}".format(item.name, item.packing, item.price))
+        MealWriter().write(self, sys.stdout)
+
+class MealWriter():
+    """
+    流式输出套餐条目: lines()逐行生成，write()按块批量写入任意文件对象
+    支持 text(与原show_item格式相同) / jsonl / csv 三种格式
+    with_quantity=True 时按(条目, 数量)输出，每种条目一行并带数量列
+    """
+
+    def __init__(self, format="text", chunk_size=4096, with_quantity=False):
+        self.format = format
+        self.chunk_size = chunk_size
+        self.with_quantity = with_quantity
+
+    def lines(self, meal):
+        if self.with_quantity:
+            rows = meal.counted_items()
+        else:
+            rows = ((item, None) for item in meal.items)
+        if self.format == "text":
+            for item, quantity in rows:
+                line = "名称:{}, 包装:{}, 价格:{}".format(item.name, item.packing, item.price)
+                yield line + ("\n" if quantity is None else ", 数量:{}\n".format(quantity))
+        elif self.format == "jsonl":
+            for item, quantity in rows:
+                record = {"name": item.name, "packing": item.packing.type, "price": item.price}
+                if quantity is not None:
+                    record["quantity"] = quantity
+                yield json.dumps(record, ensure_ascii=False) + "\n"
+        elif self.format == "csv":
+            buffer = io.StringIO()
+            writer = csv.writer(buffer, lineterminator="\n")
+
+            def flush():
+                line = buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+                return line
+
+            writer.writerow(("name", "packing", "price") + (("quantity",) if self.with_quantity else ()))
+            yield flush()
+            for item, quantity in rows:
+                row = (item.name, item.packing.type, item.price)
+                writer.writerow(row if quantity is None else row + (quantity,))
+                yield flush()
+        else:
+            raise ValueError("不支持的输出格式:{}".format(self.format))
+
+    def write(self, meal, file):
+        lines = self.lines(meal)
+        chunk = "".join(islice(lines, self.chunk_size))
+        while chunk:
+            file.write(chunk)
+            chunk = "".join(islice(lines, self.chunk_size))
+
+
+CatalogueItem = namedtuple("CatalogueItem", ["name", "packing", "price", "category"])
+
+
+class ItemCatalogue():
+    """
+    条目目录: 条目是不可变的CatalogueItem，内容相同的条目只保存一份并被所有套餐共享
+    """
+
+    def __init__(self):
+        self._by_class = {}
+        self._by_value = {}
+
+    def intern(self, item):
+        return self._by_value.setdefault(item, item)
+
+    def get(self, item_cls):
+        item = self._by_class.get(item_cls)
+        if item is None:
+            item = self.intern(CatalogueItem(item_cls.name, item_cls.packing, item_cls.price, item_cls.category))
+            self._by_class[item_cls] = item
+        return item
+
+
+catalogue = ItemCatalogue()
+
+
+class CatalogueMeal(Meal):
+    """
+    只保存共享条目的引用和数量的套餐，适合大量订单常驻内存
+    """
+
+    @property
+    def items(self):
+        return [item for item, quantity in self.quantities.items() for _ in range(quantity)]
+
+    @items.setter
+    def items(self, items):
+        self.quantities = {}
+        self.cost = 0
+        self.packing_counts = {}
+        self.category_costs = {}
+        for item in items:
+            self.add_item(item)
+
+    def add_item(self, item, quantity=1):
+        self.quantities[item] = self.quantities.get(item, 0) + quantity
+        self._account(item, quantity)
+
+    def remove_item(self, item, quantity=1):
+        left = self.quantities.get(item, 0) - quantity
+        if left < 0:
+            raise ValueError("{}的数量不足{}".format(item.name, quantity))
+        if left:
+            self.quantities[item] = left
+        else:
+            del self.quantities[item]
+        self._account(item, -quantity)
+
+    def counted_items(self):
+        return self.quantities.items()
+
+    def show_item(self):
+        MealWriter(with_quantity=True).write(self, sys.stdout)
+
 
 class MealBuilder():
     """
     实际的builder类负责创建Meal对象
+    传入条目目录时改为创建CatalogueMeal，条目从目录中取共享实例
     """
-    def prepareVegMeal(self):
-        meal = Meal()
-        meal.add_item(VegBurger())
-        meal.add_item(Coke())
+    def __init__(self, catalogue=None):
+        self.catalogue = catalogue
+
+    def _prepare(self, *item_classes):
+        if self.catalogue is None:
+            meal = Meal()
+            for item_cls in item_classes:
+                meal.add_item(item_cls())
+        else:
+            meal = CatalogueMeal()
+            for item_cls in item_classes:
+                meal.add_item(self.catalogue.get(item_cls))
         return meal
 
+    def prepareVegMeal(self):
+        return self._prepare(VegBurger, Coke)
+
 
     def prepareNonVegMeal(self):
+        return self._prepare(ChickenBurger, Pepsi)
+
+class MealBatchBuilder():
+    """
+    批量builder: 将大量套餐按列存储在array中(条目类型编码、价格、包装编码)，
+    第i个套餐的条目位于 offsets[i]:offsets[i+1]，需要时再转换回Meal对象
+    """
+    item_types = (VegBurger, ChickenBurger, Coke, Pepsi)
+    packing_types = ("wrapper", "bottle")
+    recipes = {
+        "veg": (VegBurger, Coke),
+        "non_veg": (ChickenBurger, Pepsi),
+    }
+
+    def __init__(self):
+        self.item_codes = array("B")
+        self.prices = array("d")
+        self.packing_codes = array("B")
+        self.offsets = array("Q", [0])
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def prepare_meals(self, kind, n):
+        recipe = self.recipes[kind]
+        size = len(recipe)
+        self.item_codes.extend(array("B", [self.item_types.index(cls) for cls in recipe]) * n)
+        self.prices.extend(array("d", [cls.price for cls in recipe]) * n)
+        self.packing_codes.extend(array("B", [self.packing_types.index(cls.packing.type) for cls in recipe]) * n)
+        start = self.offsets[-1]
+        self.offsets.extend(range(start + size, start + size * n + 1, size))
+
+    def get_costs(self):
+        """
+        用前缀和一次性计算每个套餐的总价
+        """
+        prefix = array("d", accumulate(self.prices, initial=0))
+        ends = map(prefix.__getitem__, self.offsets[1:])
+        starts = map(prefix.__getitem__, self.offsets[:-1])
+        return array("d", map(operator.sub, ends, starts))
+
+    def meal(self, index):
         meal = Meal()
-        meal.add_item(ChickenBurger())
-        meal.add_item(Pepsi())
+        for code in self.item_codes[self.offsets[index]:self.offsets[index + 1]]:
+            meal.add_item(self.item_types[code]())
         return meal
 
+    def meals(self):
+        for index in range(len(self)):
+            yield self.meal(index)
+
+
 class BuilderPatternDemo():
     @classmethod
     def main(cls):
@@ -181,8 +408,82 @@ class BuilderPatternDemo():
 
 
 
+def benchmark_get_cost(size=100000, number=10000):
+    """
+    对比在size个条目的套餐上逐项求和与增量维护的总价查询耗时
+    """
+    meal = Meal()
+    for _ in range(size // 2):
+        meal.add_item(VegBurger())
+        meal.add_item(Coke())
+    resum = timeit.timeit(lambda: sum(item.price for item in meal.items), number=10)
+    incremental = timeit.timeit(meal.get_cost, number=number)
+    print("{}个条目, 逐项求和: {:.1f}us/次, 增量维护: {:.3f}us/次".format(
+        size, resum / 10 * 1e6, incremental / number * 1e6))
+
+
+def benchmark_batch_builder(number=1000000):
+    """
+    对比逐个构建Meal对象与批量列式构建number个套餐并计算总价的耗时
+    """
+    start = time.perf_counter()
+    builder = MealBuilder()
+    costs = [builder.prepareVegMeal().get_cost() if i % 2 else builder.prepareNonVegMeal().get_cost()
+             for i in range(number)]
+    objects = time.perf_counter() - start
+
+    start = time.perf_counter()
+    batch = MealBatchBuilder()
+    batch.prepare_meals("veg", number // 2)
+    batch.prepare_meals("non_veg", number - number // 2)
+    batch_costs = batch.get_costs()
+    columnar = time.perf_counter() - start
+
+    print("{}个套餐, 逐个构建: {:.3f}s, 批量列式构建: {:.3f}s, 总金额: {} / {}".format(
+        number, objects, columnar, sum(costs), sum(batch_costs)))
+
+
+def benchmark_catalogue_memory(number=100000):
+    """
+    使用tracemalloc对比number份套餐的订单簿: 每份套餐新建条目 vs 共享目录条目+数量
+    """
+    for label, builder in (("独立条目", MealBuilder()), ("共享条目", MealBuilder(catalogue))):
+        tracemalloc.start()
+        orders = [builder.prepareVegMeal() if i % 2 else builder.prepareNonVegMeal() for i in range(number)]
+        current, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print("{}份套餐, {}: {:.1f}MB".format(number, label, current / 1024 / 1024))
+        del orders
+
+
+def benchmark_meal_writer(size=1000000):
+    """
+    对比逐条print与流式分块写入size个条目的耗时
+    """
+    meal = Meal()
+    for _ in range(size // 2):
+        meal.add_item(VegBurger())
+        meal.add_item(Coke())
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(devnull):
+            for item in meal.items:
+                print("名称:{}, 包装:{}, 价格:{}".format(item.name, item.packing, item.price))
+        printed = time.perf_counter() - start
+        results = []
+        for format in ("text", "jsonl", "csv"):
+            start = time.perf_counter()
+            MealWriter(format).write(meal, devnull)
+            results.append("{}: {:.3f}s".format(format, time.perf_counter() - start))
+    print("{}个条目, 逐条print: {:.3f}s, 流式写入 {}".format(size, printed, ", ".join(results)))
+
+
 if __name__ == '__main__':
     BuilderPatternDemo().main()
+    benchmark_get_cost()
+    benchmark_batch_builder()
+    benchmark_catalogue_memory()
+    benchmark_meal_writer()
 
 """
 实例:
@@ -20,7 +20,16 @@
     3. 它必须自行向整个系统提供这个实例
     。单例模式是一种对象创建型模式。单例模式又名单件模式或单态模式。
 """
+import asyncio
+import multiprocessing
+import os
+import sys
 import threading
+import time
+import weakref
+from array import array
+from collections import OrderedDict
+from multiprocessing import shared_memory
 
 class Singleton(object):
     _instance_locak = threading.Lock()
@@ -33,6 +42,328 @@ class Singleton(object):
         return Singleton._instance
 
 
+class SingletonMeta(type):
+    """
+    单例元类: 每个使用该元类的类(包括子类)各自拥有一个实例
+    只有第一次创建时加锁，之后只是一次字典读取；__init__也只在第一次创建时执行
+    每个类单独一把创建锁，一个单例的__init__中可以再创建其他单例而不会死锁
+    """
+    _instances = {}
+    _locks = {}
+    _lock = threading.Lock()
+
+    def __call__(cls, *args, **kwargs):
+        instance = SingletonMeta._instances.get(cls)
+        if instance is None:
+            with SingletonMeta._lock:
+                class_lock = SingletonMeta._locks.setdefault(cls, threading.Lock())
+            with class_lock:
+                instance = SingletonMeta._instances.get(cls)
+                if instance is None:
+                    instance = super().__call__(*args, **kwargs)
+                    SingletonMeta._instances[cls] = instance
+        return instance
+
+    @classmethod
+    def _after_fork(mcs):
+        # fork时锁可能正被其他线程持有，子进程中需要换成新锁
+        mcs._lock = threading.Lock()
+        mcs._locks = {}
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=SingletonMeta._after_fork)
+
+
+class PrintSpooler(metaclass=SingletonMeta):
+    pass
+
+
+class NetworkPrintSpooler(PrintSpooler):
+    pass
+
+
+class AsyncSingleton(object):
+    """
+    异步单例: 在asyncio中使用，await Cls.instance() 获取实例
+        1. 子类在 async def initialize() 中完成耗时的异步初始化，只执行一次
+        2. 并发的调用者共享同一个进行中的初始化任务，不会阻塞事件循环
+        3. 初始化失败时异常抛给所有等待者，下一次调用会重新初始化
+    """
+    _instances = {}
+    _pending = {}
+
+    async def initialize(self):
+        pass
+
+    @classmethod
+    async def instance(cls):
+        instance = AsyncSingleton._instances.get(cls)
+        if instance is not None:
+            return instance
+        task = AsyncSingleton._pending.get(cls)
+        if task is None:
+            task = asyncio.ensure_future(cls._create())
+            AsyncSingleton._pending[cls] = task
+        # shield: 某个等待者被取消时不影响其他等待者共享的初始化任务
+        return await asyncio.shield(task)
+
+    @classmethod
+    async def _create(cls):
+        try:
+            instance = cls()
+            await instance.initialize()
+            AsyncSingleton._instances[cls] = instance
+            return instance
+        finally:
+            AsyncSingleton._pending.pop(cls, None)
+
+
+class AsyncDatabaseClient(AsyncSingleton):
+    initialized = 0
+
+    async def initialize(self):
+        await asyncio.sleep(0.01)
+        AsyncDatabaseClient.initialized += 1
+
+
+async def benchmark_async_singleton(number=10000):
+    """
+    number个协程并发获取异步单例，初始化只应执行一次
+    """
+    start = time.perf_counter()
+    clients = await asyncio.gather(*(AsyncDatabaseClient.instance() for _ in range(number)))
+    cost = time.perf_counter() - start
+    print("{}个协程并发获取: {:.3f}s, 初始化次数:{}, 同一实例:{}".format(
+        number, cost, AsyncDatabaseClient.initialized, all(client is clients[0] for client in clients)))
+
+
+class Multiton(object):
+    """
+    多例: 按key缓存有限个实例，对应"允许可变数目的实例"
+        1. 超过capacity时淘汰最久未使用的实例(LRU)，可选ttl秒后过期重建
+        2. 每个key单独一把创建锁，不同key的实例可以并行初始化
+           创建锁记录持有和等待的线程数，最后一个线程离开时才移除，创建失败也不会破坏"每个key一个实例"
+        3. 统计命中、未命中、淘汰次数
+    """
+
+    def __init__(self, factory, capacity=128, ttl=None):
+        self.factory = factory
+        self.capacity = capacity
+        self.ttl = ttl
+        self._instances = OrderedDict()
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _lookup(self, key):
+        # 调用方需持有self._lock
+        entry = self._instances.get(key)
+        if entry is None:
+            return None
+        instance, created = entry
+        if self.ttl is not None and time.monotonic() - created > self.ttl:
+            del self._instances[key]
+            self.evictions += 1
+            return None
+        self._instances.move_to_end(key)
+        self.hits += 1
+        return instance
+
+    def get(self, key):
+        with self._lock:
+            instance = self._lookup(key)
+            if instance is not None:
+                return instance
+            # [锁, 持有及等待该锁的线程数]
+            entry = self._key_locks.get(key)
+            if entry is None:
+                entry = self._key_locks[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                with self._lock:
+                    instance = self._lookup(key)
+                    if instance is not None:
+                        return instance
+                    self.misses += 1
+                instance = self.factory(key)
+                with self._lock:
+                    self._instances[key] = (instance, time.monotonic())
+                    while len(self._instances) > self.capacity:
+                        self._instances.popitem(last=False)
+                        self.evictions += 1
+        finally:
+            # 最后一个离开的线程移除这把锁，无论创建成功与否都不会留下锁导致无限增长
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
+        return instance
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._instances.clear()
+            else:
+                self._instances.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._instances), "hits": self.hits,
+                    "misses": self.misses, "evictions": self.evictions}
+
+
+class TenantClient(object):
+    def __init__(self, tenant):
+        self.tenant = tenant
+
+
+class PreforkSingleton(metaclass=SingletonMeta):
+    """
+    多进程单例: 在fork之前于主进程中创建实例
+        1. 只读为主的大块数据通过share()写入共享内存，所有worker映射同一份物理内存，不会因引用计数写入而被复制
+        2. 子进程fork后调用after_fork()，子类在其中重建套接字、锁等不能跨进程共享的资源
+    fork钩子只在类级别注册一次，由它分发给仍然存活的实例
+    close()释放共享内存并把实例移出单例注册表，之后再调用该类会创建新实例
+    """
+    _live = weakref.WeakSet()
+
+    def __init__(self):
+        self._shm = None
+        self._size = 0
+        self._owner = os.getpid()
+        PreforkSingleton._live.add(self)
+
+    @staticmethod
+    def _after_fork_all():
+        for instance in list(PreforkSingleton._live):
+            instance.after_fork()
+
+    def share(self, data):
+        self._release()
+        self._size = len(data)
+        self._shm = shared_memory.SharedMemory(create=True, size=max(self._size, 1))
+        self._shm.buf[:self._size] = data
+        self._owner = os.getpid()
+
+    @property
+    def shared(self):
+        if self._shm is None:
+            raise ValueError("{}的共享内存未创建或已关闭".format(type(self).__name__))
+        return self._shm.buf[:self._size]
+
+    def after_fork(self):
+        pass
+
+    def _release(self):
+        if self._shm is not None:
+            self._shm.close()
+            if os.getpid() == self._owner:
+                self._shm.unlink()
+            self._shm = None
+
+    def close(self):
+        self._release()
+        with SingletonMeta._lock:
+            if SingletonMeta._instances.get(type(self)) is self:
+                del SingletonMeta._instances[type(self)]
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=PreforkSingleton._after_fork_all)
+
+
+class LookupTable(PreforkSingleton):
+    def __init__(self, size=1000000):
+        super().__init__()
+        self.share(array("q", range(size)).tobytes())
+
+    def values(self):
+        return self.shared.cast("q")
+
+
+def _proportional_rss():
+    # Pss按共享进程数平摊共享页，比RSS更能反映每个worker的真实内存占用
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            for line in f:
+                if line.startswith("Pss:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    # 没有Pss时退回峰值RSS(不平摊共享页): Linux单位为KB，macOS单位为字节
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _private_worker(size, queue):
+    # 与共享单例使用相同的数据表示，只比较"每个进程一份"与"所有进程共享一份"
+    table = array("q", range(size))
+    sum(table)
+    queue.put(_proportional_rss())
+
+
+def _shared_worker(size, queue):
+    values = LookupTable().values()
+    sum(values)
+    values.release()
+    queue.put(_proportional_rss())
+
+
+def benchmark_prefork_rss(workers=8, size=1000000):
+    """
+    fork出workers个进程，对比每个进程各自构建数据与共享fork前创建的单例时，所有worker的内存合计
+    """
+    context = multiprocessing.get_context("fork")
+    LookupTable(size)
+    for label, target in (("各自构建", _private_worker), ("共享单例", _shared_worker)):
+        queue = context.Queue()
+        processes = [context.Process(target=target, args=(size, queue)) for _ in range(workers)]
+        for process in processes:
+            process.start()
+        total = sum(queue.get() for _ in processes)
+        for process in processes:
+            process.join()
+        print("{}个worker {}: 合计{:.1f}MB".format(workers, label, total / 1024 / 1024))
+    LookupTable().close()
+
+
+def benchmark_contention(threads=32, number=100000):
+    """
+    threads个线程同时反复构造单例，对比Singleton与SingletonMeta的总耗时
+    """
+    for cls in (Singleton, PrintSpooler):
+        def work():
+            for _ in range(number):
+                cls()
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        start = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        print("{}个线程x{}次构造 {}: {:.3f}s".format(threads, number, cls.__name__, time.perf_counter() - start))
+
+
+if __name__ == '__main__':
+    print(PrintSpooler() is PrintSpooler())
+    print(NetworkPrintSpooler() is PrintSpooler())
+
+    clients = Multiton(TenantClient, capacity=2)
+    for tenant in ("a", "b", "a", "c", "b"):
+        clients.get(tenant)
+    print(clients.stats())
+
+    benchmark_contention()
+    asyncio.run(benchmark_async_singleton())
+    benchmark_prefork_rss()
+
+
 """
 单例模式的目的是保证一个类仅有一个实例，并提供一个访问它的全局访问点。单例模式包含的角色只有一个，就是单例类——Singleton。单例类拥有一个私有构造函数，确保用户无法通过new关键字直接实例化它。除此之外，该模式中包含一个静态私有成员变量与静态公有的工厂方法，该工厂方法负责检验实例的存在性并实例化自己，然后存储在静态成员变量中，以确保只有一个实例被创建。
 
@@ -1,7 +1,111 @@
 """"""
-from datetime import datetime
+import re
+import sys
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+
+class DateParserFactory(object):
+    """
+    日期解析器工厂: 按格式串返回专用的解析器，同一格式串只构建一次
+        1. "%Y-%m-%d" 使用手写的快速解析，不经过strptime
+        2. 其他格式编译成正则表达式后解析，遇到不支持的指令时退回strptime
+           格式中缺少的年/月/日与strptime一样取1900/1/1
+        3. 每个解析器带一个LRU缓存，重复出现的日期字符串直接返回结果
+    """
+    directives = {
+        "%Y": r"(?P<year>\d{4})",
+        "%m": r"(?P<month>\d{1,2})",
+        "%d": r"(?P<day>\d{1,2})",
+        "%H": r"(?P<hour>\d{1,2})",
+        "%M": r"(?P<minute>\d{1,2})",
+        "%S": r"(?P<second>\d{1,2})",
+    }
+    defaults = {"year": 1900, "month": 1, "day": 1}
+    _parsers = {}
+
+    @classmethod
+    def get_parser(cls, fmt, cache_size=4096):
+        parser = cls._parsers.get(fmt)
+        if parser is None:
+            if fmt == "%Y-%m-%d":
+                parser = cls._parse_iso
+            else:
+                parser = cls._regex_parser(fmt)
+            parser = lru_cache(maxsize=cache_size)(parser)
+            cls._parsers[fmt] = parser
+        return parser
+
+    @staticmethod
+    def _parse_iso(str_time):
+        # 年份恰好4位、月日1~2位ASCII数字，不允许符号、空白、下划线
+        # 比strptime更严格: strptime接受空格补位的月日(如"2018-12- 7")，这里会抛出ValueError
+        parts = str_time.split("-")
+        if (len(parts) != 3 or len(parts[0]) != 4 or not 1 <= len(parts[1]) <= 2 or not 1 <= len(parts[2]) <= 2
+                or not all(part.isascii() and part.isdigit() for part in parts)):
+            raise ValueError("time data {!r} does not match format '%Y-%m-%d'".format(str_time))
+        return datetime(int(parts[0]), int(parts[1]), int(parts[2]))
+
+    @classmethod
+    def _regex_parser(cls, fmt):
+        pattern = []
+        for token in re.split(r"(%.)", fmt):
+            if token in cls.directives:
+                pattern.append(cls.directives[token])
+            elif token.startswith("%") and len(token) == 2:
+                return lambda str_time: datetime.strptime(str_time, fmt)
+            else:
+                pattern.append(re.escape(token))
+        match = re.compile("".join(pattern) + r"\Z").match
+
+        def parse(str_time):
+            result = match(str_time)
+            if result is None:
+                raise ValueError("时间字符串{!r}与格式{!r}不匹配".format(str_time, fmt))
+            fields = dict(cls.defaults)
+            fields.update((key, int(value)) for key, value in result.groupdict().items())
+            return datetime(**fields)
+
+        return parse
+
+
+def parse_date(str_time, fmt="%Y-%m-%d"):
+    return DateParserFactory.get_parser(fmt)(str_time)
+
+
+def benchmark_parse_date(number=1000000, days=3650):
+    """
+    循环解析days个不同的日期字符串共number次，对比strptime、不带缓存的快速解析与带LRU缓存的工厂解析器的耗时
+    """
+    start_day = datetime(2010, 1, 1)
+    samples = [(start_day + timedelta(days=i)).strftime("%Y-%m-%d") for i in range(days)]
+    strings = (samples * (number // days + 1))[:number]
+
+    start = time.perf_counter()
+    for str_time in strings:
+        datetime.strptime(str_time, "%Y-%m-%d")
+    strptime_cost = time.perf_counter() - start
+
+    parser = DateParserFactory.get_parser("%Y-%m-%d")
+    uncached = parser.__wrapped__
+    start = time.perf_counter()
+    for str_time in strings:
+        uncached(str_time)
+    uncached_cost = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for str_time in strings:
+        parser(str_time)
+    factory_cost = time.perf_counter() - start
+    print("解析{}个日期字符串({}个不同值), strptime: {:.2f}s, 快速解析(无缓存): {:.2f}s, 工厂解析器(LRU缓存): {:.2f}s".format(
+        number, days, strptime_cost, uncached_cost, factory_cost))
 
 
 str_time = "2018-12-7"
 print()
-print(datetime.date(datetime.strptime(str_time, "%Y-%m-%d")))
\ No newline at end of file
+print(datetime.date(parse_date(str_time)))
+
+if __name__ == '__main__':
+    if "--benchmark" in sys.argv:
+        benchmark_parse_date()
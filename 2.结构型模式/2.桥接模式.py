@@ -25,6 +25,16 @@
 # Shape 类来画出不同颜色的圆
 
 import abc
+import os
+import random
+import sys
+import time
+import tracemalloc
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import compress, repeat
+from multiprocessing import shared_memory
+from operator import add, mul
 
 """
 1. 创建桥接抽象接口
@@ -40,13 +50,154 @@ class DrawAPI(metaclass=abc.ABCMeta):
     def draw_circle(self, radius, x, y):
         pass
 
-class RedCircle(DrawAPI):
+    def draw_many(self, radii, xs, ys):
+        """
+        批量绘制: radii/xs/ys 可以是list、array或NumPy数组，默认逐个调用draw_circle
+        """
+        for radius, x, y in zip(radii, xs, ys):
+            self.draw_circle(radius, x, y)
+
+class BufferedOutput(object):
+    """
+    带缓冲的输出后端: 攒够buffer_size个字符才真正写入一次
+    可以作为上下文管理器使用，退出with语句时写出剩余内容；close()只写出缓冲，不关闭底层文件
+    """
+    def __init__(self, file=None, buffer_size=1 << 16):
+        self.file = file
+        self.buffer_size = buffer_size
+        self._chunks = []
+        self._size = 0
+
+    def write(self, text):
+        self._chunks.append(text)
+        self._size += len(text)
+        if self._size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self._chunks:
+            (self.file or sys.stdout).write("".join(self._chunks))
+            self._chunks = []
+            self._size = 0
+
+    def close(self):
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+class ColorCircle(DrawAPI):
+    """
+    按颜色绘制圆，out为输出目标(默认标准输出)，draw_many一次格式化全部圆后写入
+    """
+    color = None
+
+    def __init__(self, out=None):
+        self.out = out
+
+    def draw_circle(self, radius, x, y):
+        (self.out or sys.stdout).write("半径为:{}的{}圆\n".format(radius, self.color))
+
+    def draw_many(self, radii, xs, ys):
+        template = "半径为:{}的" + self.color + "圆\n"
+        (self.out or sys.stdout).write("".join(map(template.format, radii)))
+
+class RedCircle(ColorCircle):
+    color = "红"
+
+class GreenCircle(ColorCircle):
+    color = "绿"
+
+class RasterCircle(DrawAPI):
+    """
+    光栅化实现类: 把圆填充到内存中的灰度位图(bytearray，每像素一个字节)
+    clip=(y0, y1) 时只绘制这些行，用于分块并行渲染
+    """
+    def __init__(self, width, height, bitmap=None, value=255, clip=None):
+        self.width = width
+        self.height = height
+        self.bitmap = bitmap if bitmap is not None else bytearray(width * height)
+        self.value = value
+        self.clip = clip or (0, height)
+
     def draw_circle(self, radius, x, y):
-        print("半径为:{}的红圆".format(radius))
+        y0 = max(int(y - radius), self.clip[0])
+        y1 = min(int(y + radius), self.clip[1] - 1)
+        for row in range(y0, y1 + 1):
+            half = (radius * radius - (row - y) * (row - y)) ** 0.5 if abs(row - y) <= radius else -1
+            if half < 0:
+                continue
+            x0 = max(int(x - half), 0)
+            x1 = min(int(x + half), self.width - 1)
+            if x0 <= x1:
+                start = row * self.width
+                self.bitmap[start + x0:start + x1 + 1] = bytes((self.value,)) * (x1 - x0 + 1)
+
+class SVGCircle(DrawAPI):
+    """
+    SVG实现类: 把圆记录为<circle>元素，svg()返回完整的SVG文档字符串
+    """
+    def __init__(self, width, height, fill="red"):
+        self.width = width
+        self.height = height
+        self.fill = fill
+        self.elements = []
 
-class GreenCircle(DrawAPI):
     def draw_circle(self, radius, x, y):
-        print("半径为:{}的绿圆".format(radius))
+        self.elements.append('<circle cx="{}" cy="{}" r="{}" fill="{}"/>'.format(x, y, radius, self.fill))
+
+    def draw_many(self, radii, xs, ys):
+        template = '<circle cx="{1}" cy="{2}" r="{0}" fill="' + self.fill + '"/>'
+        self.elements.extend(map(template.format, radii, xs, ys))
+
+    def svg(self):
+        return '<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}">{}</svg>'.format(
+            self.width, self.height, "".join(self.elements))
+
+def _render_tile(name, width, height, y0, y1, circles, value):
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        raster = RasterCircle(width, height, shm.buf, value, clip=(y0, y1))
+        for radius, x, y in circles:
+            raster.draw_circle(radius, x, y)
+    finally:
+        raster = None
+        shm.close()
+
+class ParallelRasterRenderer(object):
+    """
+    多进程光栅化: 把画布按行切成tiles块，每块只分配与它相交的圆，
+    各进程直接写入同一块共享内存位图的不同行，无需再合并
+    """
+    def __init__(self, width, height, processes=None, tiles=None, value=255):
+        self.width = width
+        self.height = height
+        self.processes = processes or os.cpu_count()
+        self.tiles = tiles or self.processes * 4
+        self.value = value
+
+    def render(self, shapes):
+        shm = shared_memory.SharedMemory(create=True, size=self.width * self.height)
+        try:
+            shm.buf[:] = bytes(self.width * self.height)
+            step = -(-self.height // self.tiles)
+            with ProcessPoolExecutor(self.processes) as executor:
+                futures = []
+                for y0 in range(0, self.height, step):
+                    y1 = min(y0 + step, self.height)
+                    circles = [(shape.radius, shape.x, shape.y) for shape in shapes
+                               if shape.y + shape.radius >= y0 and shape.y - shape.radius < y1]
+                    futures.append(executor.submit(_render_tile, shm.name, self.width, self.height,
+                                                   y0, y1, circles, self.value))
+                for future in futures:
+                    future.result()
+            return bytearray(shm.buf)
+        finally:
+            shm.close()
+            shm.unlink()
 
 class Shape(metaclass=abc.ABCMeta):
     def __init__(self):
@@ -70,9 +221,155 @@ class Circle(Shape):
     def draw(self):
         self.draw_api.draw_circle(self.radius, self.x, self.y)
 
+class CircleCollection(object):
+    """
+    圆的列式存储: x/y/半径各一列array，实现类按编号存一列，适合百万级别的场景
+        1. translate/scale 对整列做变换
+        2. query_box 返回包围盒与给定矩形相交的圆的下标
+        3. draw 按实现类分组，每个实现类只调用一次draw_many
+    """
+
+    def __init__(self):
+        self.xs = array("d")
+        self.ys = array("d")
+        self.radii = array("d")
+        self.api_ids = array("H")
+        self.draw_apis = []
+        self._api_index = {}
+
+    @classmethod
+    def from_circles(cls, circles):
+        collection = cls()
+        for circle in circles:
+            collection.add(circle.x, circle.y, circle.radius, circle.draw_api)
+        return collection
+
+    def _api_id(self, draw_api):
+        api_id = self._api_index.get(id(draw_api))
+        if api_id is None:
+            api_id = self._api_index[id(draw_api)] = len(self.draw_apis)
+            self.draw_apis.append(draw_api)
+        return api_id
+
+    def __len__(self):
+        return len(self.xs)
+
+    def add(self, x, y, radius, draw_api):
+        self.xs.append(x)
+        self.ys.append(y)
+        self.radii.append(radius)
+        self.api_ids.append(self._api_id(draw_api))
+
+    def circle(self, index):
+        return Circle(self.xs[index], self.ys[index], self.radii[index], self.draw_apis[self.api_ids[index]])
+
+    def translate(self, dx, dy):
+        self.xs = array("d", map(add, self.xs, repeat(dx)))
+        self.ys = array("d", map(add, self.ys, repeat(dy)))
+
+    def scale(self, factor):
+        self.radii = array("d", map(mul, self.radii, repeat(factor)))
+
+    def query_box(self, xmin, ymin, xmax, ymax):
+        return [index for index, (x, y, radius) in enumerate(zip(self.xs, self.ys, self.radii))
+                if x + radius >= xmin and x - radius <= xmax and y + radius >= ymin and y - radius <= ymax]
+
+    def draw(self):
+        for api_id, draw_api in enumerate(self.draw_apis):
+            selector = [i == api_id for i in self.api_ids]
+            draw_api.draw_many(list(compress(self.radii, selector)),
+                               list(compress(self.xs, selector)),
+                               list(compress(self.ys, selector)))
+
+
+def benchmark_circle_collection(number=1000000):
+    """
+    对比number个Circle对象列表与CircleCollection的内存占用以及平移+绘制的耗时
+    """
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        draw_apis = (RedCircle(devnull), GreenCircle(devnull))
+
+        tracemalloc.start()
+        circles = [Circle(float(i), float(i), float(i % 100), draw_apis[i % 2]) for i in range(number)]
+        objects_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        start = time.perf_counter()
+        for circle in circles:
+            circle.x += 1
+            circle.y += 1
+            circle.draw()
+        objects_cost = time.perf_counter() - start
+
+        tracemalloc.start()
+        collection = CircleCollection()
+        for i in range(number):
+            collection.add(float(i), float(i), float(i % 100), draw_apis[i % 2])
+        columns_memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        start = time.perf_counter()
+        collection.translate(1, 1)
+        collection.draw()
+        columns_cost = time.perf_counter() - start
+
+    print("{}个圆, 对象列表: {:.1f}MB/{:.3f}s, 列式存储: {:.1f}MB/{:.3f}s".format(
+        number, objects_memory / 1024 / 1024, objects_cost, columns_memory / 1024 / 1024, columns_cost))
+
+
+def benchmark_parallel_render(width=2000, height=2000, number=5000, processes=(1, 2, 4, 8, 16)):
+    """
+    在width*height画布上渲染number个随机圆，对比不同进程数下的耗时
+    """
+    generator = random.Random(0)
+    shapes = [Circle(generator.uniform(0, width), generator.uniform(0, height), generator.uniform(5, 50), None)
+              for _ in range(number)]
+    for count in processes:
+        start = time.perf_counter()
+        ParallelRasterRenderer(width, height, processes=count).render(shapes)
+        print("{}个进程渲染{}个圆: {:.3f}s".format(count, number, time.perf_counter() - start))
+
+
+def benchmark_draw_many(number=1000000):
+    """
+    对比number个圆的绘制吞吐量(个/秒):
+        1. 逐个Circle.draw，每个圆直接写一次文件
+        2. 逐个Circle.draw，写入BufferedOutput，攒满缓冲才写文件
+        3. draw_many批量格式化后一次写入
+    """
+    radii = array("d", (i % 100 for i in range(number)))
+    xs = array("d", range(number))
+    ys = array("d", range(number))
+    with open(os.devnull, "w", encoding="utf-8") as devnull:
+        red = RedCircle(devnull)
+        circles = [Circle(x, y, radius, red) for radius, x, y in zip(radii, xs, ys)]
+        start = time.perf_counter()
+        for circle in circles:
+            circle.draw()
+        single = time.perf_counter() - start
+
+        with BufferedOutput(devnull) as out:
+            buffered = RedCircle(out)
+            circles = [Circle(x, y, radius, buffered) for radius, x, y in zip(radii, xs, ys)]
+            start = time.perf_counter()
+            for circle in circles:
+                circle.draw()
+        single_buffered = time.perf_counter() - start
+
+        with BufferedOutput(devnull) as out:
+            start = time.perf_counter()
+            RedCircle(out).draw_many(radii, xs, ys)
+        batch = time.perf_counter() - start
+    print("{}个圆, 逐个绘制: {:,.0f} 个/秒, 逐个绘制+缓冲输出: {:,.0f} 个/秒, 批量绘制: {:,.0f} 个/秒".format(
+        number, number / single, number / single_buffered, number / batch))
+
 if __name__ == '__main__':
     redCircle = Circle(1,1,5,RedCircle())
     greenCircle = Circle(2,2,6,GreenCircle())
 
     redCircle.draw()
-    greenCircle.draw()
\ No newline at end of file
+    greenCircle.draw()
+
+    GreenCircle().draw_many([1, 2, 3], [0, 0, 0], [0, 0, 0])
+
+    benchmark_draw_many()
+    benchmark_circle_collection()
+    benchmark_parallel_render()
\ No newline at end of file
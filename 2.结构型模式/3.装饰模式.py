@@ -30,6 +30,11 @@
         ConcreteDecorator: 具体装饰类
 """
 import abc
+import threading
+import time
+import timeit
+import weakref
+from collections import OrderedDict
 
 class Shap(metaclass=abc.ABCMeta):
     @abc.abstractmethod
@@ -38,24 +43,211 @@ class Shap(metaclass=abc.ABCMeta):
 
 # 创建装饰类
 class ShapeDecorator(Shap):
+    """
+    装饰类: 子类通过before/after钩子在被装饰对象绘制前后增加行为
+    修改decoratedShape时通知编译过这条装饰链的CompiledShape重新编译
+    """
+
     def __init__(self, decoratedShape):
         self.decoratedShape = decoratedShape
 
+    @property
+    def decoratedShape(self):
+        return self._decoratedShape
+
+    @decoratedShape.setter
+    def decoratedShape(self, shape):
+        self._decoratedShape = shape
+        for compiled in self.__dict__.get("_observers", ()):
+            compiled._dirty = True
+
+    def _observe(self, compiled):
+        observers = self.__dict__.get("_observers")
+        if observers is None:
+            observers = self._observers = weakref.WeakSet()
+        observers.add(compiled)
+
+    def before(self):
+        pass
+
+    def after(self):
+        pass
+
     def draw(self):
-        self.decoratedShape.draw()
+        self.before()
+        result = self.decoratedShape.draw()
+        self.after()
+        return result
 
 
 class RedShapeDecorator(ShapeDecorator):
     def __init__(self, decoratedShape):
         super().__init__(decoratedShape)
 
-    def draw(self):
-        self.decoratedShape.draw()
+    def after(self):
         self.setRedBorder(self.decoratedShape)
 
     def setRedBorder(self, decoratedShape):
         print("边框颜色:红色")
 
+
+class CachingShapeDecorator(ShapeDecorator):
+    """
+    缓存装饰类: 按被装饰对象的状态缓存draw的结果，最多保留maxsize个(LRU)
+    key为根据被装饰对象计算缓存键的函数，默认使用对象的全部属性；
+    被装饰对象本身是装饰器时沿decoratedShape向内递归，只按各层类型与最内层对象的属性计算(装饰器自身的统计属性不参与)
+    对象没有__dict__(__slots__)或属性不可哈希时退回使用id(对象)，此时状态变化后需要调用invalidate
+    缓存的读写在锁内完成，可以在多线程中共用；未命中时的draw在锁外执行
+    """
+    def __init__(self, decoratedShape, maxsize=128, key=None, enabled=True):
+        super().__init__(decoratedShape)
+        self.maxsize = maxsize
+        self.key = key or self._default_key
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def draw(self):
+        if not self.enabled:
+            return self.decoratedShape.draw()
+        key = self.key(self.decoratedShape)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return self._cache[key]
+            self.misses += 1
+        result = self.decoratedShape.draw()
+        with self._lock:
+            self._cache[key] = result
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+        return result
+
+    @classmethod
+    def _default_key(cls, shape):
+        if isinstance(shape, ShapeDecorator):
+            return type(shape), cls._default_key(shape.decoratedShape)
+        try:
+            key = tuple(sorted(vars(shape).items()))
+            hash(key)
+        except TypeError:
+            return id(shape)
+        return key
+
+    def invalidate(self):
+        with self._lock:
+            self._cache.clear()
+
+
+class TimingShapeDecorator(ShapeDecorator):
+    """
+    计时装饰类: 记录每次draw的耗时，按2的幂次微秒分桶统计直方图
+    """
+    def __init__(self, decoratedShape, enabled=True):
+        super().__init__(decoratedShape)
+        self.enabled = enabled
+        self.count = 0
+        self.total = 0.0
+        self.histogram = {}
+
+    def draw(self):
+        if not self.enabled:
+            return self.decoratedShape.draw()
+        start = time.perf_counter()
+        result = self.decoratedShape.draw()
+        cost = time.perf_counter() - start
+        self.count += 1
+        self.total += cost
+        bucket = 1 << (max(int(cost * 1e6), 1).bit_length() - 1)
+        self.histogram[bucket] = self.histogram.get(bucket, 0) + 1
+        return result
+
+    def report(self):
+        """
+        返回 {"count", "mean_us", "histogram": {桶下界(微秒): 次数}}
+        """
+        mean = self.total / self.count * 1e6 if self.count else 0.0
+        return {"count": self.count, "mean_us": mean, "histogram": dict(sorted(self.histogram.items()))}
+
+
+class RateLimitShapeDecorator(ShapeDecorator):
+    """
+    限流装饰类: 令牌桶算法，每秒最多rate次、允许burst次突发，超出的draw直接丢弃并计数
+    """
+    def __init__(self, decoratedShape, rate, burst=None, enabled=True):
+        super().__init__(decoratedShape)
+        self.rate = rate
+        self.burst = max(1, burst or rate)
+        self.enabled = enabled
+        self.dropped = 0
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def draw(self):
+        if not self.enabled:
+            return self.decoratedShape.draw()
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            if self._tokens < 1:
+                self.dropped += 1
+                return None
+            self._tokens -= 1
+        return self.decoratedShape.draw()
+
+
+class CompiledShape(Shap):
+    """
+    装饰链编译器: 把多层ShapeDecorator展开成一个扁平的调用列表
+        [外层before..., 被装饰对象.draw, 内层after...]
+    绘制时依次调用，不再逐层嵌套，返回被装饰对象draw的结果
+    只有这条装饰链中的某一层被修改时才重新编译
+    覆盖了draw的装饰类无法展开，会被当作被装饰对象整体调用
+    """
+
+    def __init__(self, shape):
+        self.shape = shape
+
+    @property
+    def shape(self):
+        return self._shape
+
+    @shape.setter
+    def shape(self, shape):
+        self._shape = shape
+        self._dirty = True
+
+    def compile(self):
+        before, after = [], []
+        node = self.shape
+        while isinstance(node, ShapeDecorator) and type(node).draw is ShapeDecorator.draw:
+            node._observe(self)
+            if type(node).before is not ShapeDecorator.before:
+                before.append(node.before)
+            if type(node).after is not ShapeDecorator.after:
+                after.append(node.after)
+            node = node.decoratedShape
+        self._before = tuple(before)
+        self._core = node.draw
+        self._after = tuple(after[::-1])
+        self._dirty = False
+
+    def draw(self):
+        if self._dirty:
+            self.compile()
+        for step in self._before:
+            step()
+        result = self._core()
+        for step in self._after:
+            step()
+        return result
+
 class Rectangle(Shap):
     def draw(self):
         print("长方形")
@@ -65,6 +257,29 @@ class Circle(Shap):
     def draw(self):
         print("圆")
 
+
+def benchmark_compiled_chain(depths=(1, 2, 5, 10, 20, 50), number=100000):
+    """
+    对比嵌套调用与编译后的扁平调用在不同装饰层数下单次绘制的耗时
+    """
+    class Blank(Shap):
+        def draw(self):
+            pass
+
+    class Hook(ShapeDecorator):
+        def after(self):
+            pass
+
+    for depth in depths:
+        shape = Blank()
+        for _ in range(depth):
+            shape = Hook(shape)
+        compiled = CompiledShape(shape)
+        nested_cost = timeit.timeit(shape.draw, number=number)
+        compiled_cost = timeit.timeit(compiled.draw, number=number)
+        print("装饰层数:{:>3}, 嵌套调用: {:.2f}us, 编译后: {:.2f}us".format(
+            depth, nested_cost / number * 1e6, compiled_cost / number * 1e6))
+
 if __name__ == '__main__':
     circle = Circle()
     redCircle = RedShapeDecorator(Circle())
@@ -77,6 +292,18 @@ if __name__ == '__main__':
     redRectangle.draw() # 输出自己是长放心，还能输出自己的边框颜色
     print("\r\n")
 
+    compiledCircle = CompiledShape(RedShapeDecorator(RedShapeDecorator(Circle())))
+    compiledCircle.draw() # 与嵌套调用输出相同
+    print("\r\n")
+
+    timedCircle = TimingShapeDecorator(RateLimitShapeDecorator(CachingShapeDecorator(Circle()), rate=2))
+    for _ in range(3):
+        timedCircle.draw() # 第一次绘制后结果被缓存，第三次被限流丢弃
+    print(timedCircle.report())
+    print("\r\n")
+
+    benchmark_compiled_chain()
+
 """
 优点:
     装饰类和被装饰类可以独立发展，不会相互耦合，
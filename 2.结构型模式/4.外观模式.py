@@ -57,6 +57,11 @@
     关闭电脑（按一下电源键）：关闭硬盘、关闭内存、关闭CPU
 """
 import abc
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
 class Shap(metaclass=abc.ABCMeta):
 
     @abc.abstractmethod
@@ -78,26 +83,234 @@ class Circle(Shap):
         print("圆...")
 
 class ShapeMaker():
-    def __init__(self):
-        self.rect = Rectangle()
-        self.square = Square()
-        self.circle = Circle()
+    """
+    外观类: 子系统在第一次使用时才创建(每个子系统一把锁，不同子系统可以并行创建)
+    draw_all 把绘制请求并发分发给各子系统，按传入顺序返回结果
+    线程池在close()、退出with语句或外观对象被回收时关闭
+    """
+    subsystems = {"rect": Rectangle, "square": Square, "circle": Circle}
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers
+        self._executor = None
+        self._finalizer = None
+        self._lock = threading.Lock()
+        self._locks = {name: threading.Lock() for name in self.subsystems}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _subsystem(self, name):
+        subsystem = self.__dict__.get(name)
+        if subsystem is None:
+            with self._locks[name]:
+                subsystem = self.__dict__.get(name)
+                if subsystem is None:
+                    subsystem = self.__dict__[name] = self.subsystems[name]()
+        return subsystem
+
+    rect = property(lambda self: self._subsystem("rect"))
+    square = property(lambda self: self._subsystem("square"))
+    circle = property(lambda self: self._subsystem("circle"))
 
     def drawCircle(self):
-        self.circle.draw()
+        return self.circle.draw()
 
     def drawRectangle(self):
-        self.rect.draw()
+        return self.rect.draw()
 
     def drawSquare(self):
-        self.square.draw()
+        return self.square.draw()
+
+    def draw_all(self, names=None):
+        names = list(self.subsystems) if names is None else list(names)
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    executor = ThreadPoolExecutor(self.max_workers or len(self.subsystems))
+                    self._finalizer = weakref.finalize(self, executor.shutdown, wait=False)
+                    self._executor = executor
+        futures = [self._executor.submit(self._draw, name) for name in names]
+        return [future.result() for future in futures]
+
+    def _draw(self, name):
+        return self._subsystem(name).draw()
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            self._finalizer.detach()
+            executor.shutdown()
+
+
+class SingleFlight(object):
+    """
+    请求合并: 相同key的并发调用只真正执行一次，其余调用等待并共享结果(或异常)
+    ttl不为None时，成功的结果额外缓存ttl秒
+    """
+
+    class _Call(object):
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl
+        self._calls = {}
+        self._cache = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.executed = 0
+        self.coalesced = 0
+        self.cached = 0
+
+    def do(self, key, func, *args):
+        with self._lock:
+            self.requests += 1
+            if self.ttl is not None:
+                entry = self._cache.get(key)
+                if entry is not None and entry[1] > time.monotonic():
+                    self.cached += 1
+                    return entry[0]
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = func(*args)
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and self.ttl is not None:
+                    self._cache[key] = (call.result, time.monotonic() + self.ttl)
+            call.done.set()
+        return call.result
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {"requests": self.requests, "executed": self.executed,
+                    "coalesced": self.coalesced, "cached": self.cached}
+
+
+class CoalescingShapeMaker(ShapeMaker):
+    """
+    在外观层合并并发的相同请求，并可选地缓存结果，子系统只承受一小部分负载
+    drawXxx与draw_all都按子系统名合并，二者的并发请求共享同一次执行
+    """
+
+    def __init__(self, max_workers=None, ttl=None):
+        super().__init__(max_workers)
+        self.flight = SingleFlight(ttl)
+
+    def _draw(self, name):
+        return self.flight.do(name, super()._draw, name)
+
+    def drawCircle(self):
+        return self._draw("circle")
+
+    def drawRectangle(self):
+        return self._draw("rect")
+
+    def drawSquare(self):
+        return self._draw("square")
+
+
+def benchmark_coalescing(threads=50, delay=0.05):
+    """
+    threads个线程同时调用drawCircle，统计子系统实际执行次数
+    """
+    class SlowCircle(Circle):
+        draws = 0
+
+        def draw(self):
+            SlowCircle.draws += 1
+            time.sleep(delay)
+            return "圆"
+
+    class SlowShapeMaker(CoalescingShapeMaker):
+        subsystems = dict(CoalescingShapeMaker.subsystems, circle=SlowCircle)
+
+    maker = SlowShapeMaker(ttl=1)
+    workers = [threading.Thread(target=maker.drawCircle) for _ in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    maker.drawCircle()
+    print("{}+1次调用, 子系统执行{}次, 统计{}".format(threads, SlowCircle.draws, maker.flight.stats()))
+
+
+def benchmark_facade(delay=0.05):
+    """
+    子系统创建和绘制各耗时delay秒时，对比饿汉式/懒加载的启动时间与串行/并发绘制的耗时
+    """
+    def slow(cls):
+        class Slow(cls):
+            def __init__(self):
+                time.sleep(delay)
+
+            def draw(self):
+                time.sleep(delay)
+                return cls.__name__
+        return Slow
+
+    class SlowShapeMaker(ShapeMaker):
+        subsystems = {name: slow(cls) for name, cls in ShapeMaker.subsystems.items()}
+
+    start = time.perf_counter()
+    eager = [cls() for cls in SlowShapeMaker.subsystems.values()]
+    eager_startup = time.perf_counter() - start
+    start = time.perf_counter()
+    maker = SlowShapeMaker()
+    lazy_startup = time.perf_counter() - start
+
+    with maker:
+        start = time.perf_counter()
+        maker.draw_all()
+        first_cost = time.perf_counter() - start
+
+        start = time.perf_counter()
+        serial = [shape.draw() for shape in eager]
+        serial_cost = time.perf_counter() - start
+        start = time.perf_counter()
+        results = maker.draw_all()
+        fan_out_cost = time.perf_counter() - start
+    print("启动: 饿汉式{:.3f}s, 懒加载{:.3f}s; 首次并发绘制(含创建){:.3f}s; 绘制: 串行{:.3f}s, 并发{:.3f}s, 结果{}".format(
+        eager_startup, lazy_startup, first_cost, serial_cost, fan_out_cost, results == serial))
 
 if __name__ == '__main__':
 
-    sm = ShapeMaker()
-    sm.drawCircle()
-    sm.drawRectangle()
-    sm.drawSquare()
+    with ShapeMaker() as sm:
+        sm.drawCircle()
+        sm.drawRectangle()
+        sm.drawSquare()
+        sm.draw_all()
+
+    benchmark_facade()
+    benchmark_coalescing()
 
 
 """
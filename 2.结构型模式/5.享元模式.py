@@ -61,11 +61,23 @@
 
 """
 import abc
+import contextlib
+import os
 import random
+import sys
+import threading
+import time
+import tracemalloc
+import weakref
+from array import array
+from collections import OrderedDict
 
 class Shape(metaclass=abc.ABCMeta):
     @abc.abstractmethod
-    def draw(self):
+    def draw(self, extrinsic=None):
+        """
+        extrinsic: 外部状态，如圆的(x, y, radius)；不传时使用对象上设置的状态
+        """
         pass
 
 class Circle(Shape):
@@ -83,25 +95,362 @@ class Circle(Shape):
     def set_radius(self, radius):
         self.radius = radius
 
-    def draw(self):
-        print("{}颜色的圆: x:{}, y:{}, radius:{}".format(self.color, self.x, self.y, self.radius))
+    def draw(self, extrinsic=None):
+        x, y, radius = extrinsic if extrinsic is not None else (self.x, self.y, self.radius)
+        print("{}颜色的圆: x:{}, y:{}, radius:{}".format(self.color, x, y, radius))
 
 
 
+class FlyweightPool(object):
+    """
+    线程安全的享元池:
+        1. 按key分段加锁(lock striping)创建享元，保证同一个key只创建一个对象，不同key可以并行创建
+        2. capacity限制池大小，超出时淘汰最久未使用的享元(LRU)
+        3. weak=True时改用弱引用，享元不再被外部引用时自动从池中移除
+        4. 统计命中、创建、淘汰次数
+        5. 支持 key in pool 与 pool[key]，pool[key]只查找已有享元，不存在时抛出KeyError
+    """
+
+    def __init__(self, factory, capacity=None, weak=False, stripes=16):
+        self.factory = factory
+        self.capacity = capacity
+        self.weak = weak
+        self._pool = weakref.WeakValueDictionary() if weak else OrderedDict()
+        self._lock = threading.Lock()
+        self._stripes = [threading.Lock() for _ in range(stripes)]
+        self.hits = 0
+        self.created = 0
+        self.evictions = 0
+
+    def _lookup(self, key):
+        # 调用方需持有self._lock
+        flyweight = self._pool.get(key)
+        if flyweight is not None:
+            self.hits += 1
+            if not self.weak:
+                self._pool.move_to_end(key)
+        return flyweight
+
+    def get(self, key):
+        with self._lock:
+            flyweight = self._lookup(key)
+        if flyweight is not None:
+            return flyweight
+        with self._stripes[hash(key) % len(self._stripes)]:
+            with self._lock:
+                flyweight = self._lookup(key)
+            if flyweight is None:
+                flyweight = self.factory(key)
+                with self._lock:
+                    self._pool[key] = flyweight
+                    self.created += 1
+                    if not self.weak and self.capacity is not None:
+                        while len(self._pool) > self.capacity:
+                            self._pool.popitem(last=False)
+                            self.evictions += 1
+        return flyweight
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._pool
+
+    def __getitem__(self, key):
+        with self._lock:
+            flyweight = self._lookup(key)
+        if flyweight is None:
+            raise KeyError(key)
+        return flyweight
+
+    def __iter__(self):
+        with self._lock:
+            return iter(list(self._pool))
+
+    def __len__(self):
+        return len(self._pool)
+
+    def stats(self):
+        with self._lock:
+            return {"size": len(self._pool), "hits": self.hits,
+                    "created": self.created, "evictions": self.evictions}
+
+
+class ExtrinsicStore(object):
+    """
+    外部状态存储: x/y/radius 与享元下标各占一列array，享元本身只保存内部状态(颜色)
+    绘制时把第i行外部状态传给享元的draw，不再修改共享对象，可以安全地并行使用
+    typecode默认"d"(双精度)，与Python的float一致，存取不丢失精度，每个圆占 3个double + 1个下标 共28字节
+    坐标可以容忍单精度误差时传入typecode="f"，每个圆只占16字节
+    """
+
+    def __init__(self, typecode="d"):
+        self.typecode = typecode
+        self.xs = array(typecode)
+        self.ys = array(typecode)
+        self.radii = array(typecode)
+        self.indexes = array("I")
+        self.flyweights = []
+        self._index = {}
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def _flyweight_index(self, flyweight):
+        index = self._index.get(id(flyweight))
+        if index is None:
+            index = self._index[id(flyweight)] = len(self.flyweights)
+            self.flyweights.append(flyweight)
+        return index
+
+    def add(self, flyweight, x, y, radius):
+        index = self._flyweight_index(flyweight)
+        self.xs.append(x)
+        self.ys.append(y)
+        self.radii.append(radius)
+        self.indexes.append(index)
+
+    def add_many(self, flyweight, xs, ys, radii):
+        """
+        批量添加同一个享元的多个外部状态，用于大量数据的装载
+        """
+        count = len(xs)
+        self.xs.extend(array(self.typecode, xs))
+        self.ys.extend(array(self.typecode, ys))
+        self.radii.extend(array(self.typecode, radii))
+        self.indexes.extend(array("I", [self._flyweight_index(flyweight)]) * count)
+
+    def row(self, i):
+        return self.xs[i], self.ys[i], self.radii[i]
+
+    def draw(self, i):
+        self.flyweights[self.indexes[i]].draw(self.row(i))
+
+    def draw_all(self):
+        flyweights = self.flyweights
+        for index, row in zip(self.indexes, zip(self.xs, self.ys, self.radii)):
+            flyweights[index].draw(row)
+
+
+class IntrinsicState(object):
+    """
+    不可变的组合内部状态，如(颜色, 样式, 字体)，创建时计算一次哈希，之后作为字典键时无需重新计算
+    """
+    __slots__ = ("values", "hash")
+
+    def __init__(self, values):
+        self.values = values
+        self.hash = hash(values)
+
+    def __hash__(self):
+        return self.hash
+
+    def __eq__(self, other):
+        return isinstance(other, IntrinsicState) and self.hash == other.hash and self.values == other.values
+
+    def __iter__(self):
+        return iter(self.values)
+
+    def __getitem__(self, index):
+        return self.values[index]
+
+    def __repr__(self):
+        return "IntrinsicState{!r}".format(self.values)
+
+
+class FlyweightFactory(object):
+    """
+    通用享元工厂: 对任意可哈希的内部状态元组做驻留(interning)，相同状态只保留一个享元
+    factory根据IntrinsicState创建享元，默认享元就是IntrinsicState本身
+    享元同时登记在两个索引中: 以元组为键(按元组查找，不额外创建对象)和以IntrinsicState为键
+    重复使用同一批IntrinsicState记录时走后者，直接使用缓存的哈希，命中时按身份比较，不再比较元组内容
+    intern_many 用于批量装载大量记录，并统计去重比例
+    """
+
+    def __init__(self, factory=None):
+        self.factory = factory or (lambda state: state)
+        self._flyweights = {}
+        self._by_state = {}
+        self._lock = threading.Lock()
+        self.requests = 0
+
+    def _create(self, values):
+        state = values if type(values) is IntrinsicState else IntrinsicState(values)
+        with self._lock:
+            flyweight = self._by_state.get(state)
+            if flyweight is None:
+                flyweight = self._by_state[state] = self._flyweights[state.values] = self.factory(state)
+        return flyweight
+
+    def _get(self, values):
+        if type(values) is IntrinsicState:
+            return self._by_state.get(values)
+        return self._flyweights.get(values)
+
+    def intern(self, values):
+        """
+        values与intern_many的一条记录相同: 元组或IntrinsicState
+        intern(("Red", "solid", "Arial")) 或 intern(IntrinsicState(("Red", "solid", "Arial")))
+        """
+        with self._lock:
+            self.requests += 1
+        flyweight = self._get(values)
+        if flyweight is None:
+            flyweight = self._create(values)
+        return flyweight
+
+    def intern_many(self, records):
+        """
+        records中的每条记录可以是元组，也可以是IntrinsicState
+        """
+        get_values = self._flyweights.get
+        get_state = self._by_state.get
+        create = self._create
+        result = []
+        append = result.append
+        for values in records:
+            flyweight = get_state(values) if type(values) is IntrinsicState else get_values(values)
+            if flyweight is None:
+                flyweight = create(values)
+            append(flyweight)
+        with self._lock:
+            self.requests += len(result)
+        return result
+
+    def __len__(self):
+        return len(self._flyweights)
+
+    def dedupe_ratio(self):
+        """
+        平均每个享元被复用的次数: 请求数 / 享元数
+        """
+        return self.requests / len(self._flyweights) if self._flyweights else 0.0
+
+
 class ShapeFactory():
     """
     {
-        "color":
+        "color": Circle
     }
     """
-    circle_color = dict()
+    circle_color = FlyweightPool(Circle, capacity=256)
+    intrinsic = FlyweightFactory()
+
     @classmethod
     def get_circle(cls, color):
-        if color in cls.circle_color:
-            return cls.circle_color[color]
-        else:
-            cls.circle_color[color] = Circle(color)
-            return cls.circle_color[color]
+        return cls.circle_color.get(color)
+
+    @classmethod
+    def intern(cls, values):
+        return cls.intrinsic.intern(values)
+
+    @classmethod
+    def intern_many(cls, records):
+        return cls.intrinsic.intern_many(records)
+
+
+def benchmark_flyweight_pool(threads=16, number=20000, keys=1000):
+    """
+    threads个线程并发从享元池获取keys个不同的享元，检查每个key只创建了一个对象
+    """
+    class SlowCircle(Circle):
+        def __init__(self, color):
+            time.sleep(0.0001)  # 放大创建时的竞争窗口
+            super().__init__(color)
+
+    pool = FlyweightPool(SlowCircle)
+    seen = [dict() for _ in range(threads)]
+
+    def work(index):
+        generator = random.Random(index)
+        for _ in range(number):
+            color = "color{}".format(generator.randrange(keys))
+            seen[index].setdefault(color, set()).add(id(pool.get(color)))
+
+    workers = [threading.Thread(target=work, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    cost = time.perf_counter() - start
+    instances = {}
+    for result in seen:
+        for color, ids in result.items():
+            instances.setdefault(color, set()).update(ids)
+    unique = all(len(ids) == 1 for ids in instances.values())
+    print("{}个线程x{}次获取: {:.3f}s, 每个key唯一实例:{}, 统计{}".format(
+        threads, number, cost, unique, pool.stats()))
+
+
+def benchmark_intern_many(number=1000000, distinct=10000):
+    """
+    批量驻留number条(颜色, 样式, 字体)记录，其中只有distinct种不同组合
+    分别以元组和预先构建的IntrinsicState作为记录，后者查找时直接使用缓存的哈希
+    """
+    generator = random.Random(0)
+    combos = [("color{}".format(i % 50), "style{}".format(i % 20), "font{}".format(i)) for i in range(distinct)]
+    picks = [generator.randrange(distinct) for _ in range(number)]
+    states = [IntrinsicState(combo) for combo in combos]
+    for name, source in (("元组", combos), ("IntrinsicState", states)):
+        records = [source[i] for i in picks]
+        factory = FlyweightFactory()
+        start = time.perf_counter()
+        flyweights = factory.intern_many(records)
+        cost = time.perf_counter() - start
+        print("驻留{}条{}记录: {:.3f}s, 享元数:{}, 去重比例:{:.1f}, 集合构建{}个键".format(
+            number, name, cost, len(factory), factory.dedupe_ratio(), len(set(flyweights))))
+
+
+def benchmark_extrinsic_store(number=10000000, objects=1000000, render=100000):
+    """
+    对比 每个圆一个对象 与 享元+外部状态存储 的每个圆内存占用，以及两种方式的绘制吞吐量
+    """
+    colors = ["Red", "Green", "Blue", "White", "Black"]
+
+    tracemalloc.start()
+    circles = []
+    for i in range(objects):
+        circle = Circle(colors[i % 5])
+        circle.set_x(i % 1000)
+        circle.set_y(i % 777)
+        circle.set_radius(100)
+        circles.append(circle)
+    object_bytes = tracemalloc.get_traced_memory()[0] / objects
+    tracemalloc.stop()
+    del circles
+
+    flyweights = [ShapeFactory.get_circle(color) for color in colors]
+    chunk = number // len(flyweights)
+    store_bytes = {}
+    for typecode in ("f", "d"):
+        store = None
+        tracemalloc.start()
+        store = ExtrinsicStore(typecode)
+        for flyweight in flyweights:
+            positions = range(chunk)
+            store.add_many(flyweight, positions, positions, [100] * chunk)
+        store_bytes[typecode] = tracemalloc.get_traced_memory()[0] / number
+        tracemalloc.stop()
+    print("每个圆内存: 独立对象{:.1f}字节, 外部状态存储 double{:.1f}字节 / float{:.1f}字节({}个圆)".format(
+        object_bytes, store_bytes["d"], store_bytes["f"], number))
+
+    # 两种方式绘制同样的圆: 第i个圆的享元都取自store.indexes[i]
+    flyweights, indexes = store.flyweights, store.indexes
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+        for i in range(render):
+            circle = flyweights[indexes[i]]
+            circle.set_x(store.xs[i])
+            circle.set_y(store.ys[i])
+            circle.set_radius(store.radii[i])
+            circle.draw()
+        setter_cost = time.perf_counter() - start
+        start = time.perf_counter()
+        for i in range(render):
+            store.draw(i)
+        store_cost = time.perf_counter() - start
+    print("绘制{}个圆: 修改共享状态{:,.0f}个/秒, 传入外部状态{:,.0f}个/秒".format(
+        render, render / setter_cost, render / store_cost))
+
 
 if __name__ == '__main__':
 
@@ -121,6 +470,7 @@ if __name__ == '__main__':
 
     print(circle_id)  # {2678877878368: 5, 2678877880048: 3, 2678877879768: 5, 2678877880160: 2, 2678877880216: 5}
 
-
-
-
+    if "--benchmark" in sys.argv:
+        benchmark_flyweight_pool()
+        benchmark_extrinsic_store()
+        benchmark_intern_many()